@@ -0,0 +1,239 @@
+"""
+extract.py — Structured figure extraction from annual report PDFs.
+
+Finds the financial statement pages (balance sheet, profit and loss, cash flow)
+by the title at the top of the page, reads the column years from the header
+block under "(₹ in crore)", and parses line items into numeric records. Untitled
+pages that directly follow a statement with the same columns continue it. Rows
+whose values can't be matched one-to-one to the columns are dropped. Records are
+saved alongside the RAG index to back `/balance-sheet` and direct figure lookups.
+
+Record shape:
+    {"statement": "balance_sheet", "line_item": "Total Assets", "key": "total_assets",
+     "year": "2024", "value": 1755986.0, "page": 212}
+"""
+
+import os
+import re
+import json
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+# ---------- CONFIG ----------
+MAX_EXTRACT_WORKERS = int(os.getenv("EXTRACT_MAX_WORKERS", str(os.cpu_count() or 4)))
+# ----------------------------
+
+# Statement titles, matched only against the heading lines at the top of a page.
+STATEMENT_TITLES = [
+    ("balance_sheet", re.compile(r"^(?:consolidated\s+|standalone\s+)?balance\s+sheet\b", re.I)),
+    ("profit_and_loss", re.compile(r"^(?:consolidated\s+|standalone\s+)?statement\s+of\s+profit\s+and\s+loss\b", re.I)),
+    ("cash_flow", re.compile(
+        r"^(?:consolidated\s+|standalone\s+)?(?:statement\s+of\s+cash\s+flows?|cash\s+flow\s+statement)\b", re.I)),
+]
+TITLE_LINES = 4
+# "(₹ in crore)" opens the column header block ("Notes 2023-24 2022-23", "As at 31st March, 2024 ...").
+UNIT_RE = re.compile(r"^\(.{0,3}\s*in\s+(?:crore|lakh|million)\)$", re.I)
+UNIT_LINES = 10
+HEADER_LINE_RE = re.compile(r"^(?:notes|particulars|as\s+at|year\s+ended|31(?:st)?\s+march|20\d{2}\s*-\s*\d{2}\b)", re.I)
+# A column is either a balance date or a fiscal year range, which means the year it ends in.
+COLUMN_YEAR_RE = re.compile(r"31(?:st)?\s+March\s*,?\s*(20\d{2})|\b(20\d{2})\s*-\s*(\d{2})\b", re.I)
+NOTE_RE = re.compile(r"^\d{1,2}(?:\.\d{1,2})?$")
+NIL_VALUES = ("-", "–", "—")
+# One figure or a nil dash; the lookahead stops a digit run from splitting into several tokens.
+NUMBER_RE = r"(?:\(\d[\d,]*(?:\.\d+)?\)|-?\d[\d,]*(?:\.\d+)?|[-–—])(?=\s|$)"
+LINE_RE = re.compile(
+    rf"^(?:\(?[a-z0-9]{{1,4}}\)\s*|[a-z0-9]{{1,4}}\.\s+)?(?P<label>[A-Za-z][A-Za-z0-9 ,'&()\-/.:]*?[A-Za-z)])"
+    rf"\s+(?P<numbers>{NUMBER_RE}(?:\s+{NUMBER_RE})*)\s*$"
+)
+
+# Labels as printed in the statements -> keys used in `figures_crore`.
+KEY_ALIASES = {
+    "total assets": "total_assets",
+    "total equity": "total_equity",
+    "total liabilities": "total_liabilities",
+    "revenue from operations": "revenue_from_operations",
+    "profit for the year": "profit_for_the_year",
+    "cash and cash equivalents": "cash_and_cash_equivalents",
+    "inventories": "inventories",
+    "trade receivables": "trade_receivables",
+}
+
+
+def parse_number(token: str) -> float:
+    """'1,52,770' -> 152770.0, '(1,234)' -> -1234.0, '-' -> 0.0"""
+    if token in NIL_VALUES:
+        return 0.0
+    negative = token.startswith("(") and token.endswith(")")
+    value = float(token.strip("()").replace(",", ""))
+    return -value if negative else value
+
+
+def normalise_key(label: str) -> str:
+    """Map a printed line item to a stable snake_case key."""
+    clean = re.sub(r"\s+", " ", re.sub(r"[^a-z0-9 ]", " ", label.lower())).strip()
+    return KEY_ALIASES.get(clean, clean.replace(" ", "_"))
+
+
+def detect_statement(text: str) -> Optional[str]:
+    """Return the statement type whose title heads the page, if any."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    # Line 0 is the running page header ("217 Integrated Annual Report 2023-24").
+    for line in lines[:TITLE_LINES]:
+        for name, pattern in STATEMENT_TITLES:
+            if pattern.match(line):
+                return name
+    return None
+
+
+def parse_column_years(lines: List[str]) -> List[str]:
+    """Fiscal years of the value columns, read from the header block under the unit line."""
+    start = next((i for i, line in enumerate(lines[:UNIT_LINES]) if UNIT_RE.match(line)), None)
+    if start is None:
+        return []
+    header = []
+    for line in lines[start + 1:]:
+        if not HEADER_LINE_RE.match(line):
+            break
+        header.append(line)
+
+    years = []
+    for date_year, range_start, range_end in COLUMN_YEAR_RE.findall(" ".join(header)):
+        if date_year:
+            year = date_year
+        elif int(range_end) == (int(range_start) + 1) % 100:
+            year = str(int(range_start) + 1)
+        else:
+            continue
+        if year not in years:
+            years.append(year)
+    return years
+
+
+def parse_page(text: str, page: int) -> Optional[dict]:
+    """Parse a page with a statement column header into its title, column years and value rows.
+
+    Returns None for pages without one. `statement` is None for untitled pages,
+    which may be continuations of the previous page's statement.
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    years = parse_column_years(lines)
+    if not years:
+        return None
+
+    rows = []
+    for line in lines:
+        m = LINE_RE.match(line)
+        if not m:
+            continue
+        tokens = m.group("numbers").split()
+        # A leading note reference ("Inventories 7 1,52,770 1,40,008") is the only extra column allowed.
+        if len(tokens) == len(years) + 1 and NOTE_RE.match(tokens[0]):
+            tokens = tokens[1:]
+        if len(tokens) != len(years):
+            continue
+        try:
+            values = [parse_number(v) for v in tokens]
+        except ValueError:
+            continue
+        rows.append((m.group("label").strip(" .:"), values))
+    return {"page": page, "statement": detect_statement(text), "years": years, "rows": rows}
+
+
+def assemble_records(pages: List[dict]) -> List[dict]:
+    """Turn parsed pages into records. An untitled page directly after a statement
+    page, with the same column years, continues that statement."""
+    records = []
+    current = None
+    for parsed in sorted(pages, key=lambda p: p["page"]):
+        if parsed["statement"]:
+            current = parsed
+        elif current and parsed["page"] == current["page"] + 1 and parsed["years"] == current["years"]:
+            current = dict(parsed, statement=current["statement"])
+        else:
+            current = None
+            continue
+        for label, values in parsed["rows"]:
+            for year, value in zip(parsed["years"], values):
+                records.append({
+                    "statement": current["statement"],
+                    "line_item": label,
+                    "key": normalise_key(label),
+                    "year": year,
+                    "value": value,
+                    "page": parsed["page"],
+                })
+    return records
+
+
+def _extract_pages(pdf_path: str, pages: List[int]) -> List[dict]:
+    """Worker: open the PDF once and parse a batch of pages."""
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(pdf_path)
+    parsed = []
+    for page_no in pages:
+        try:
+            text = reader.pages[page_no].extract_text() or ""
+        except Exception:
+            continue
+        result = parse_page(text, page_no + 1)
+        if result:
+            parsed.append(result)
+    return parsed
+
+
+def extract_figures_from_pdf(pdf_path: str, workers: int = MAX_EXTRACT_WORKERS) -> List[dict]:
+    """Extract statement line items from every page of a PDF, in parallel batches of pages."""
+    if not os.path.exists(pdf_path):
+        raise FileNotFoundError(f"PDF not found: {pdf_path}")
+    # Imported here so the text parsers above work without the PDF stack.
+    from PyPDF2 import PdfReader
+
+    n_pages = len(PdfReader(pdf_path).pages)
+    workers = max(1, min(workers, n_pages))
+    batches = [list(range(i, n_pages, workers)) for i in range(workers)]
+
+    print(f"[INFO] Extracting figures from {n_pages} pages with {workers} worker(s)")
+    if workers == 1:
+        results = [_extract_pages(pdf_path, batches[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_extract_pages, [pdf_path] * workers, batches))
+
+    # Continuation pages can land in different batches, so statements are stitched here.
+    records = assemble_records([p for batch in results for p in batch])
+    print(f"[INFO] Extracted {len(records)} figure records")
+    return records
+
+
+def save_figures(records: List[dict], path: str) -> None:
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(records, f, ensure_ascii=False, indent=2)
+
+
+def load_figures(path: str) -> List[dict]:
+    """Load extracted records; missing file means nothing was extracted yet."""
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_figure_index(records: List[dict]) -> Dict[Tuple[str, str], dict]:
+    """Index records by (key, year) for O(1) lookups. The first occurrence wins,
+    so the main statement beats the same label repeated in later notes."""
+    index = {}
+    for record in records:
+        index.setdefault((record["key"], record["year"]), record)
+    return index
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("usage: python -m app.extract <report.pdf> <figures.json>")
+        sys.exit(1)
+    save_figures(extract_figures_from_pdf(sys.argv[1]), sys.argv[2])
@@ -0,0 +1,260 @@
+"""
+llm.py — Pluggable LLM providers for the analyst endpoints.
+
+Providers:
+- "openai": any OpenAI-compatible chat completions API (Groq by default).
+- "local":  a GGUF model run on CPU through llama-cpp-python (offline use).
+- "stub":   deterministic canned answers, for load tests and degraded mode.
+
+Every provider exposes the same `complete()` / `stream()` calls and raises
+`LLMError` on failure. The stub is only used when selected explicitly (request
+or LLM_PROVIDER / LLM_PROVIDER_<ROLE>); a server with no provider configured
+raises `LLMConfigError`.
+
+Timeouts: `timeout` is one overall wall-clock budget for the whole call, from
+sending the request to the last token. It is checked before the call starts
+and between every chunk received (HTTP body/SSE lines, llama.cpp tokens, stub
+words); blocking waits (socket reads, the local model lock, stub latency) are
+limited to the time remaining. Exceeding it raises `LLMError`.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, Optional
+
+import requests
+
+# ---------- CONFIG ----------
+DEFAULT_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+DEFAULT_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "600"))
+DEFAULT_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.3"))
+
+OPENAI_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.groq.com/openai/v1")
+OPENAI_MODEL = os.getenv("RAG_MODEL", "llama-3.1-8b-instant")
+LOCAL_MODEL_PATH = os.getenv("LLM_LOCAL_MODEL_PATH")
+LOCAL_THREADS = int(os.getenv("LLM_LOCAL_THREADS", str(os.cpu_count() or 4)))
+STUB_LATENCY_MS = float(os.getenv("LLM_STUB_LATENCY_MS", "0"))
+# ----------------------------
+
+
+class LLMError(Exception):
+    """Raised when a provider cannot produce an answer."""
+
+
+class LLMConfigError(LLMError):
+    """Raised when the server's LLM configuration is missing or invalid."""
+
+
+def remaining(deadline: float) -> float:
+    """Seconds left before `deadline` (a time.monotonic() value); raises once it has passed."""
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise LLMError("LLM call timed out")
+    return left
+
+
+class LLMProvider(ABC):
+    """Base class: subclasses implement `_generate()`; deadlines are enforced here."""
+
+    name = "base"
+
+    @abstractmethod
+    def _generate(self, prompt: str, deadline: float) -> Iterator[str]:
+        """Yield answer chunks, bounding any blocking wait by `remaining(deadline)`."""
+
+    def stream(self, prompt: str, timeout: float = DEFAULT_TIMEOUT) -> Iterator[str]:
+        deadline = time.monotonic() + timeout
+        remaining(deadline)
+        for chunk in self._generate(prompt, deadline):
+            remaining(deadline)
+            yield chunk
+
+    def complete(self, prompt: str, timeout: float = DEFAULT_TIMEOUT) -> str:
+        return "".join(self.stream(prompt, timeout=timeout)).strip()
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Chat completions over HTTP (Groq, OpenAI, vLLM, llama.cpp server, ...)."""
+
+    name = "openai"
+
+    def __init__(self, base_url: str = OPENAI_BASE_URL, api_key: Optional[str] = None, model: str = OPENAI_MODEL):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key or os.getenv("GROQ_API_KEY") or os.getenv("OPENAI_API_KEY")
+        self.model = model
+
+    def _post(self, prompt: str, deadline: float, stream: bool) -> requests.Response:
+        if not self.api_key:
+            raise LLMError("Missing GROQ_API_KEY / OPENAI_API_KEY in environment.")
+        try:
+            # Always read the body incrementally so the deadline can be checked while it arrives.
+            r = requests.post(
+                f"{self.base_url}/chat/completions",
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                },
+                json={
+                    "model": self.model,
+                    "messages": [{"role": "user", "content": prompt}],
+                    "max_tokens": DEFAULT_MAX_TOKENS,
+                    "temperature": DEFAULT_TEMPERATURE,
+                    "stream": stream,
+                },
+                timeout=remaining(deadline),
+                stream=True,
+            )
+        except requests.RequestException as e:
+            raise LLMError(f"LLM request failed: {e}") from e
+        if r.status_code != 200:
+            raise LLMError(f"LLM error: {r.status_code} {r.text}")
+        return r
+
+    def complete(self, prompt: str, timeout: float = DEFAULT_TIMEOUT) -> str:
+        deadline = time.monotonic() + timeout
+        r = self._post(prompt, deadline, stream=False)
+        body = b""
+        try:
+            with r:
+                for part in r.iter_content(chunk_size=8192):
+                    remaining(deadline)
+                    body += part
+        except requests.RequestException as e:
+            raise LLMError(f"LLM request failed: {e}") from e
+        try:
+            return json.loads(body)["choices"][0]["message"]["content"].strip()
+        except (ValueError, KeyError, IndexError) as e:
+            raise LLMError(f"Malformed LLM response: {e}") from e
+
+    def _generate(self, prompt: str, deadline: float) -> Iterator[str]:
+        r = self._post(prompt, deadline, stream=True)
+        try:
+            with r:
+                for line in r.iter_lines(decode_unicode=True):
+                    # Keep-alive and empty lines count against the deadline too.
+                    remaining(deadline)
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        delta = json.loads(data)["choices"][0].get("delta", {})
+                    except (ValueError, KeyError, IndexError):
+                        continue
+                    if delta.get("content"):
+                        yield delta["content"]
+        except requests.RequestException as e:
+            raise LLMError(f"LLM request failed: {e}") from e
+
+
+class LocalProvider(LLMProvider):
+    """CPU inference on a GGUF model via llama-cpp-python (optional dependency)."""
+
+    name = "local"
+
+    def __init__(self, model_path: Optional[str] = LOCAL_MODEL_PATH, n_threads: int = LOCAL_THREADS):
+        self.model_path = model_path
+        self.n_threads = n_threads
+        self._llm = None
+        # llama.cpp contexts are not thread-safe; serialise generations.
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._llm is None:
+            if not self.model_path or not os.path.exists(self.model_path):
+                raise LLMError(f"Local model not found: {self.model_path}")
+            try:
+                from llama_cpp import Llama
+            except ImportError as e:
+                raise LLMError("llama-cpp-python is not installed.") from e
+            print(f"[INFO] Loading local model: {self.model_path}")
+            self._llm = Llama(model_path=self.model_path, n_threads=self.n_threads, n_ctx=4096, verbose=False)
+        return self._llm
+
+    def _generate(self, prompt: str, deadline: float) -> Iterator[str]:
+        if not self._lock.acquire(timeout=remaining(deadline)):
+            raise LLMError("LLM call timed out waiting for the local model")
+        try:
+            llm = self._load()
+            for chunk in llm.create_chat_completion(
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=DEFAULT_MAX_TOKENS,
+                temperature=DEFAULT_TEMPERATURE,
+                stream=True,
+            ):
+                remaining(deadline)
+                content = chunk["choices"][0].get("delta", {}).get("content")
+                if content:
+                    yield content
+        finally:
+            self._lock.release()
+
+
+class StubProvider(LLMProvider):
+    """Deterministic answers derived from the prompt hash; no network, no model."""
+
+    name = "stub"
+
+    def __init__(self, latency_ms: float = STUB_LATENCY_MS):
+        self.latency_ms = latency_ms
+
+    def _generate(self, prompt: str, deadline: float) -> Iterator[str]:
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        words = f"[stub answer {digest}] Offline mode: no LLM was called for this question.".split(" ")
+        delay = self.latency_ms / 1000 / len(words)
+        for i, word in enumerate(words):
+            if delay:
+                left = remaining(deadline)
+                time.sleep(min(delay, left))
+                if delay >= left:
+                    raise LLMError("LLM call timed out")
+            yield word if i == 0 else " " + word
+
+
+PROVIDERS = {
+    "openai": OpenAICompatibleProvider,
+    "local": LocalProvider,
+    "stub": StubProvider,
+}
+
+# Cache
+_provider_cache: Dict[str, LLMProvider] = {}
+_provider_lock = threading.Lock()
+
+
+def default_provider_name(role: Optional[str] = None) -> str:
+    """Provider for a role: LLM_PROVIDER_<ROLE>, then LLM_PROVIDER, then whatever is configured.
+
+    Raises LLMConfigError if the configured name is unknown or nothing is configured.
+    """
+    for var in ([f"LLM_PROVIDER_{role.upper()}"] if role else []) + ["LLM_PROVIDER"]:
+        name = os.getenv(var)
+        if name:
+            if name.lower() not in PROVIDERS:
+                raise LLMConfigError(f"Unknown LLM provider in {var}: {name}")
+            return name.lower()
+    if os.getenv("GROQ_API_KEY") or os.getenv("OPENAI_API_KEY"):
+        return "openai"
+    if LOCAL_MODEL_PATH:
+        return "local"
+    raise LLMConfigError("Missing GROQ_API_KEY / OPENAI_API_KEY (or LLM_LOCAL_MODEL_PATH) in environment.")
+
+
+def get_provider(name: Optional[str] = None, role: Optional[str] = None) -> LLMProvider:
+    """Return a cached provider instance by name, or the default for `role`.
+
+    An unknown `name` raises LLMError; a bad or missing default raises LLMConfigError.
+    """
+    name = name.lower() if name else default_provider_name(role)
+    if name not in PROVIDERS:
+        raise LLMError(f"Unknown LLM provider: {name}")
+    if name not in _provider_cache:
+        with _provider_lock:
+            if name not in _provider_cache:
+                _provider_cache[name] = PROVIDERS[name]()
+    return _provider_cache[name]
@@ -1,12 +1,15 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 import os
-import openai
-from .model import load_data, USERS
+from .model import data_fiscal_year, load_data, merge_figures, USERS
 from .settings import settings
+from .profiling import PROFILING_ENABLED, ProfilingMiddleware, profiled, profile_section
 
 app = FastAPI(title="Balance Sheet Analyst API")
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,18 +25,34 @@ DATA = load_data(settings.DATA_PATH)
 # add these imports at top of main.py
 import os
 from fastapi import Request
-from .rag_utils import ensure_index, query_rag
-
-# ensure index on startup (non-blocking thread)
-PDF_PATH = os.getenv("RAG_PDF_PATH", "/Users/prasunndubey/Desktop/balance-sheet-analyst/backend/app/reliance_consolidated.pdf")
+from .rag_utils import DEFAULT_COMPANY, DEFAULT_FISCAL_YEAR, ensure_all_indexes, is_entitled, load_shard_registry, normalise_company, query_rag, resolve_shards, shard_key
+from .extract import build_figure_index, load_figures
 
 # optional: build index synchronously once at startup (commented if you prefer manual)
 try:
-    # load prebuilt RAG index (much faster)
-    INDEX, META = ensure_index()
+    # load prebuilt RAG shards (much faster)
+    SHARDS = ensure_all_indexes()
 except Exception as e:
     print("RAG index ensure error:", e)
-    INDEX, META = None, None
+    SHARDS = {}
+
+# Structured figures extracted from the default shard's report during ingestion
+try:
+    default_shard = load_shard_registry().get(shard_key(DEFAULT_COMPANY, DEFAULT_FISCAL_YEAR), {})
+    DATA = merge_figures(DATA, load_figures(default_shard.get("figures_path")))
+except Exception as e:
+    print("Figure extraction load error:", e)
+FIGURES = build_figure_index(DATA.get("line_items", []))
+DATA_YEAR = data_fiscal_year(DATA) or DEFAULT_FISCAL_YEAR
+
+
+def serves_default_data(user: dict, company: str | None, fiscal_year: str | None = None) -> bool:
+    """True if the curated DATA (default company, DATA_YEAR) applies to this user and request."""
+    if not is_entitled(user.get("companies", []), DEFAULT_COMPANY):
+        return False
+    if company and normalise_company(company) != normalise_company(DEFAULT_COMPANY):
+        return False
+    return not fiscal_year or fiscal_year == DATA_YEAR
     
 
 
@@ -43,6 +62,7 @@ class LoginRequest(BaseModel):
     password: str
 
 @app.post("/login")
+@profiled
 def login(req: LoginRequest):
     user = USERS.get(req.email)
     if not user or user["password"] != req.password:
@@ -56,6 +76,7 @@ def login(req: LoginRequest):
     }
 
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 app.add_middleware(
     CORSMiddleware,
@@ -67,6 +88,7 @@ app.add_middleware(
 
 # ---------- Data endpoints ----------
 @app.get("/balance-sheet")
+@profiled
 def get_balance_sheet(token: str, company: str | None = None):
     user = USERS.get(token)
     if not user:
@@ -74,59 +96,125 @@ def get_balance_sheet(token: str, company: str | None = None):
 
     # If multi-company support exists, pick requested company if allowed
     allowed = user.get("companies", [])
-    if company and (allowed != ["ALL"] and company not in allowed):
+    if company and not is_entitled(allowed, company):
+        raise HTTPException(status_code=403, detail="Not authorized for this company")
+    if not is_entitled(allowed, DEFAULT_COMPANY):
         raise HTTPException(status_code=403, detail="Not authorized for this company")
+    if not serves_default_data(user, company):
+        raise HTTPException(status_code=404, detail="No balance-sheet data for this company")
 
     # Demo: only one dataset is available (DATA). Return as consistent structure.
     result = {"company": DATA.get("company"), "data": DATA}
-    return result
+    # Render here so serialization is part of the profiled endpoint
+    with profile_section("serialize"):
+        response = JSONResponse(content=result)
+    return response
+
+
+@app.get("/figures")
+def get_figure(token: str, key: str, year: str | None = None):
+    """Indexed lookup of a single extracted line item, e.g. key=total_assets&year=2023."""
+    user = USERS.get(token)
+    if not user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    # Extracted figures all come from the default company's report.
+    if not is_entitled(user.get("companies", []), DEFAULT_COMPANY):
+        raise HTTPException(status_code=403, detail="Not authorized for this company")
+
+    year = year or DATA_YEAR
+    record = FIGURES.get((key, year))
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"No figure for {key} in {year}")
+    return record
     
 
 
 
 from fastapi import Body, HTTPException
-from fastapi.responses import JSONResponse
-import os, requests, json
+from fastapi.responses import JSONResponse, StreamingResponse
+import os, json
 from pydantic import BaseModel
-from .rag_utils import query_rag
+from .llm import LLMConfigError, LLMError, get_provider
+from .router import ROUTER_STATS, route_question
 
 class AnalyzeRequest(BaseModel):
     question: str
+    company: str | None = None
+    fiscal_year: str | None = None
+    provider: str | None = None  # "openai" | "local" | "stub"; default per user role
 
-@app.post("/analyze")
-def analyze(req: AnalyzeRequest, token: str):
-    """Enhanced LLM + RAG endpoint — combines balance-sheet data with retrieved PDF context."""
 
-    # 1️⃣ Authentication
+def authorize_analysis(req: AnalyzeRequest, token: str) -> dict:
+    """Authenticate the user and check the requested company is in their entitlements."""
     user = USERS.get(token)
     if not user:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    # 2️⃣ Structured company financial data (existing balance sheet)
-    structured_context = DATA.get("figures_crore", {})
+    allowed = user.get("companies", [])
+    if req.company and not is_entitled(allowed, req.company):
+        raise HTTPException(status_code=403, detail="Not authorized for this company")
+    return user
+
+
+def route_locally(req: AnalyzeRequest, user: dict):
+    """Answer figure/ratio lookups from the structured data; None means ask the LLM."""
+    routed = None
+    # Structured figures only exist for the default company; other years come from the figure index.
+    if serves_default_data(user, req.company):
+        with profile_section("router"):
+            routed = route_question(
+                req.question,
+                DATA.get("figures_crore", {}),
+                FIGURES,
+                DATA.get("company", DEFAULT_COMPANY),
+                DATA_YEAR,
+                req.fiscal_year,
+            )
+    ROUTER_STATS.record(routed is not None)
+    return routed
+
+
+def build_analysis_context(req: AnalyzeRequest, user: dict):
+    """Retrieve RAG context and build the LLM prompt for a question."""
+    allowed = user.get("companies", [])
+
+    # 2️⃣ Structured company financial data — only when it is the company/year being asked about
+    structured_context = {}
+    context_label = "not available for the requested company / year"
+    if serves_default_data(user, req.company, req.fiscal_year):
+        structured_context = DATA.get("figures_crore", {})
+        context_label = f"{DATA.get('company', DEFAULT_COMPANY)}, FY{DATA_YEAR}"
 
-    # 3️⃣ Retrieve relevant document excerpts via RAG
+    # 3️⃣ Retrieve relevant document excerpts via RAG (only the user's shards)
     retrieved_text = ""
     try:
-        retrieved_chunks = query_rag(req.question, top_k=4)
+        shards = resolve_shards(allowed, req.company, req.fiscal_year)
+        with profile_section("rag"):
+            retrieved_chunks = query_rag(req.question, top_k=4, shards=shards)
         if retrieved_chunks:
             retrieved_text = "\n\n".join(retrieved_chunks)
     except Exception as e:
         print(f"[WARN] RAG retrieval failed: {e}")
 
     # 4️⃣ Build final context-aware prompt
-    prompt = f"""
+    with profile_section("prompt"):
+        prompt = build_prompt(req.question, structured_context, context_label, retrieved_text)
+    return prompt, retrieved_text, structured_context
+
+
+def build_prompt(question: str, structured_context: dict, context_label: str, retrieved_text: str) -> str:
+    return f"""
 You are a senior financial analyst AI.
 Answer based on BOTH the provided structured financial data and the retrieved report excerpts.
 
-Structured Financial Context (₹ crore):
+Structured Financial Context — {context_label} (₹ crore):
 {json.dumps(structured_context, indent=2)}
 
 Retrieved Text from Annual Report:
 {retrieved_text}
 
 User Question:
-{req.question}
+{question}
 
 Guidelines:
 - Base your answer ONLY on the data above (no hallucination).
@@ -135,56 +223,100 @@ Guidelines:
 - Include relevant ratios, trends, or recommendations if applicable.
 """
 
-    # 5️⃣ Call Groq API
-    groq_key = os.getenv("GROQ_API_KEY")
-    if not groq_key:
+
+def select_provider(req: AnalyzeRequest, user: dict):
+    """Provider named in the request, else the server default for the user's role."""
+    try:
+        return get_provider(req.provider, role=user["role"])
+    except LLMConfigError as e:
+        # Server-side misconfiguration (no provider set up, bad LLM_PROVIDER_<ROLE>)
+        print(f"[WARN] LLM not configured: {e}")
+        raise HTTPException(status_code=500, detail=f"LLM not configured: {e}")
+    except LLMError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/analyze")
+@profiled
+def analyze(req: AnalyzeRequest, token: str):
+    """Enhanced LLM + RAG endpoint — combines balance-sheet data with retrieved PDF context."""
+    # 1️⃣ Authentication
+    user = authorize_analysis(req, token)
+
+    # ⚡ Pure lookups / ratios are answered from structured data, no LLM call
+    routed = route_locally(req, user)
+    if routed:
         return JSONResponse(
             content={
-                "answer": "❌ Missing GROQ_API_KEY in environment. RAG retrieval shown below.",
-                "retrieved": retrieved_text,
-                "context": structured_context,
+                "answer": routed["answer"],
+                "provider": "router",
+                "values": routed["values"],
+                "context": DATA.get("figures_crore", {}) if routed["year"] == DATA_YEAR else {},
             },
             status_code=200,
         )
 
-    try:
-        r = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {groq_key}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": os.getenv("RAG_MODEL", "llama-3.1-8b-instant"),
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": 600,
-                "temperature": 0.3,
-            },
-            timeout=60,
-        )
-        if r.status_code != 200:
-            return JSONResponse(
-                content={"answer": f"LLM error: {r.status_code} {r.text}"},
-                status_code=500,
-            )
-
-        answer = r.json()["choices"][0]["message"]["content"].strip()
+    provider = select_provider(req, user)
+    prompt, retrieved_text, structured_context = build_analysis_context(req, user)
 
-        # ✅ Successful response
+    # 5️⃣ Call the selected LLM provider
+    try:
+        with profile_section("llm"):
+            answer = provider.complete(prompt)
+    except LLMError as e:
         return JSONResponse(
             content={
-                "answer": answer,
+                "answer": f"{e}",
+                "provider": provider.name,
                 "retrieved": retrieved_text,
                 "context": structured_context,
             },
-            status_code=200,
+            status_code=500,
         )
-
     except Exception as e:
         return JSONResponse(
             content={
-                "answer": f"Unexpected error while calling Groq: {e}",
+                "answer": f"Unexpected error while calling {provider.name} LLM: {e}",
                 "context": structured_context,
             },
             status_code=500,
         )
+
+    # ✅ Successful response
+    with profile_section("serialize"):
+        response = JSONResponse(
+            content={
+                "answer": answer,
+                "provider": provider.name,
+                "retrieved": retrieved_text,
+                "context": structured_context,
+            },
+            status_code=200,
+        )
+    return response
+
+
+@app.post("/analyze/stream")
+def analyze_stream(req: AnalyzeRequest, token: str):
+    """Same as /analyze, but streams the answer as plain text while it is generated."""
+    user = authorize_analysis(req, token)
+    routed = route_locally(req, user)
+    if routed:
+        return StreamingResponse(iter([routed["answer"]]), media_type="text/plain", headers={"X-LLM-Provider": "router"})
+
+    provider = select_provider(req, user)
+    prompt, _, _ = build_analysis_context(req, user)
+
+    def generate():
+        try:
+            yield from provider.stream(prompt)
+        except LLMError as e:
+            yield f"\n[LLM error: {e}]"
+
+    return StreamingResponse(generate(), media_type="text/plain", headers={"X-LLM-Provider": provider.name})
+
+
+@app.get("/router/stats")
+def router_stats():
+    """Share of /analyze traffic answered by the local router instead of the LLM."""
+    return ROUTER_STATS.snapshot()
@@ -1,12 +1,37 @@
 import json
+import re
 from pathlib import Path
 
+from .extract import KEY_ALIASES
+
 def load_data(path="data/reliance_2024.json"):
     p = Path(path)
     if not p.exists():
         raise FileNotFoundError(f"{path} not found. Place cleaned JSON there.")
     return json.loads(p.read_text())
 
+def data_fiscal_year(data: dict) -> str | None:
+    """Fiscal year the curated figures belong to, from `fiscal_year_end` ("31 March 2024" -> "2024")."""
+    m = re.search(r"\d{4}", data.get("fiscal_year_end", ""))
+    return m.group(0) if m else None
+
+def merge_figures(data: dict, records: list) -> dict:
+    """Add extracted statement records to the hand-curated data.
+
+    Records go under `line_items`; headline `figures_crore` keys missing for
+    the data's fiscal year are filled from them. Curated figures are never overwritten.
+    """
+    if not records:
+        return data
+    year = data_fiscal_year(data)
+    headline = set(KEY_ALIASES.values())
+    figures = data.setdefault("figures_crore", {})
+    for record in records:
+        if record["year"] == year and record["key"] in headline and record["statement"] != "cash_flow":
+            figures.setdefault(record["key"], record["value"])
+    data["line_items"] = records
+    return data
+
 # Dummy users for demonstration
 USERS = {
     "analyst@company.com": {"password": "analyst123", "role": "analyst", "companies": ["Reliance"]},
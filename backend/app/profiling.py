@@ -0,0 +1,151 @@
+"""
+profiling.py — Opt-in per-request profiling for the API.
+
+PROFILE_REQUESTS=1       profile every request, dump those slower than PROFILE_SLOW_MS
+PROFILE_REQUESTS=header  profile only requests sent with `X-Profile: 1` (always dumped)
+
+The middleware is only installed when PROFILE_REQUESTS is set, so unprofiled
+deployments pay nothing for it. Profiled requests get a `Server-Timing` header with the time spent in each
+`profile_section()` (RAG retrieval, prompt building, LLM call, ...). Dumps are
+written to PROFILE_DIR as a `.prof` file (open with snakeviz / pstats) plus a
+`.txt` summary of the hottest functions.
+
+Limits: only the endpoint's own worker thread is profiled, so time spent in the
+multi-shard fan-out threads of `query_rag` shows up as waiting, with its total
+in the `rag` section. On Python 3.12+ only one cProfile profiler can be active
+per process; concurrent profiled requests then run unprofiled (section timings
+are still recorded and the dump notes it).
+"""
+
+import os
+import io
+import time
+import pstats
+import cProfile
+import itertools
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.base import BaseHTTPMiddleware
+
+# ---------- CONFIG ----------
+PROFILE_MODE = os.getenv("PROFILE_REQUESTS", "").lower()
+PROFILING_ENABLED = PROFILE_MODE in ("1", "true", "header")
+PROFILE_HEADER = "X-Profile"
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "500"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_TOP = int(os.getenv("PROFILE_TOP", "30"))
+# ----------------------------
+
+
+class RequestProfile:
+    """Profiles and section timings collected while serving one request."""
+
+    def __init__(self, forced: bool):
+        self.forced = forced
+        self.profiles: List[cProfile.Profile] = []
+        self.sections: Dict[str, float] = {}
+        self.unprofiled = 0
+
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+_dump_ids = itertools.count()
+
+
+def profiled(func):
+    """Run a (sync) endpoint under cProfile when its request is being profiled.
+
+    Sync endpoints execute in a worker thread, which a profiler started in the
+    middleware would not see; the context variable is copied into that thread.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        rp = _current.get()
+        if rp is None:
+            return func(*args, **kwargs)
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            # Another profiler is active (Python 3.12+ allows one per process).
+            rp.unprofiled += 1
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            prof.disable()
+            rp.profiles.append(prof)
+    return wrapper
+
+
+@contextmanager
+def profile_section(name: str):
+    """Time a block of a profiled request; a no-op otherwise."""
+    rp = _current.get()
+    if rp is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        rp.sections[name] = rp.sections.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def dump_profile(rp: RequestProfile, method: str, path: str, elapsed_ms: float) -> Optional[str]:
+    """Write the request's profile to PROFILE_DIR; returns the .prof path."""
+    if not rp.profiles:
+        return None
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = path.strip("/").replace("/", "_") or "root"
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}_{int(elapsed_ms)}ms_{method}_{slug}_{os.getpid()}-{next(_dump_ids)}"
+    base = os.path.join(PROFILE_DIR, name)
+
+    stats = pstats.Stats(rp.profiles[0])
+    for prof in rp.profiles[1:]:
+        stats.add(prof)
+    stats.dump_stats(base + ".prof")
+
+    out = io.StringIO()
+    out.write(f"{method} {path} {elapsed_ms:.1f} ms\n")
+    for section, ms in rp.sections.items():
+        out.write(f"  {section}: {ms:.1f} ms\n")
+    if rp.unprofiled:
+        out.write(f"  ({rp.unprofiled} call(s) ran unprofiled: another profiler was active)\n")
+    out.write("\n")
+    pstats.Stats(base + ".prof", stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+    with open(base + ".txt", "w", encoding="utf-8") as f:
+        f.write(out.getvalue())
+    print(f"[INFO] Profile written: {base}.prof")
+    return base + ".prof"
+
+
+class ProfilingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        forced = PROFILING_ENABLED and request.headers.get(PROFILE_HEADER) == "1"
+        if not forced and PROFILE_MODE not in ("1", "true"):
+            return await call_next(request)
+
+        rp = RequestProfile(forced)
+        token = _current.set(rp)
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            _current.reset(token)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        timings = [f"{name};dur={ms:.1f}" for name, ms in rp.sections.items()]
+        timings.append(f"total;dur={elapsed_ms:.1f}")
+        response.headers["Server-Timing"] = ", ".join(timings)
+
+        if rp.forced or elapsed_ms >= PROFILE_SLOW_MS:
+            try:
+                # pstats dumping and file writes must not block the event loop.
+                await run_in_threadpool(dump_profile, rp, request.method, request.url.path, elapsed_ms)
+            except Exception as e:
+                print(f"[WARN] Profile dump failed: {e}")
+        return response
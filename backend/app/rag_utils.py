@@ -1,34 +1,57 @@
 """
 rag_utils.py — Efficient PDF-based Retrieval Augmented Generation (RAG) helper.
-Builds, caches, and queries a FAISS index from large company reports.
+Builds, caches, and queries FAISS indexes from large company reports.
+
+Retrieval is sharded by (company, fiscal year): every shard has its own PDF,
+index and metadata file, so a query only searches the reports it is routed to.
 """
 
 import os
 import json
+import threading
 import faiss
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
-from typing import List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from sentence_transformers import SentenceTransformer
 from PyPDF2 import PdfReader
 
+from .extract import extract_figures_from_pdf, save_figures
+
 # ---------- CONFIG ----------
 INDEX_PATH = "backend/app/rag_index.faiss"
 META_PATH = "backend/app/rag_meta.json"
+FIGURES_PATH = os.getenv(
+    "RAG_FIGURES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "rag_figures.json"),
+)
 EMBED_MODEL = "all-MiniLM-L6-v2"
 PDF_PATH = os.getenv(
     "RAG_PDF_PATH",
-    "/Users/prasunndubey/Desktop/balance-sheet-analyst/backend/app/reliance_consolidated.pdf",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "reliance_consolidated.pdf"),
 )
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
+
+# Shard registry: JSON list of {"company", "fiscal_year", "pdf_path", "index_path", "meta_path", "figures_path"}.
+# Without it a single Reliance FY2024 shard is served from the paths above.
+SHARDS_CONFIG = os.getenv("RAG_SHARDS_CONFIG")
+DEFAULT_COMPANY = "Reliance"
+DEFAULT_FISCAL_YEAR = "2024"
+MAX_SHARD_WORKERS = int(os.getenv("RAG_MAX_SHARD_WORKERS", "4"))
 # ----------------------------
 
 # Cache
 _model_cache = None
-_index_cache = None
-_meta_cache = None
+_registry_cache = None
+_shard_cache: Dict[Tuple[str, str], Tuple[faiss.Index, List[str]]] = {}
+_shard_failures: Dict[Tuple[str, str], str] = {}
+_shard_locks: Dict[Tuple[str, str], threading.Lock] = {}
+_shard_locks_guard = threading.Lock()
+# Shared pool for multi-shard fan-out, so queries don't pay thread start-up.
+_shard_pool = ThreadPoolExecutor(max_workers=MAX_SHARD_WORKERS, thread_name_prefix="rag-shard")
 
 
 # ---------- HELPERS ----------
@@ -70,10 +93,85 @@ def chunk_text(text: str, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP) -> List[
     return chunks
 
 
-def build_index_from_pdf(pdf_path: str) -> dict:
-    """Builds a FAISS index from the PDF and saves it."""
-    if not os.path.exists(os.path.dirname(INDEX_PATH)):
-        os.makedirs(os.path.dirname(INDEX_PATH), exist_ok=True)
+def normalise_company(company: str) -> str:
+    """Case/whitespace-insensitive company name used for routing and entitlements."""
+    return company.strip().lower()
+
+
+def is_entitled(allowed_companies: Iterable[str], company: str) -> bool:
+    """True if `company` is in the user's entitlements (["ALL"] means every company)."""
+    allowed = {normalise_company(c) for c in allowed_companies}
+    return "all" in allowed or normalise_company(company) in allowed
+
+
+def shard_key(company: str, fiscal_year: str) -> Tuple[str, str]:
+    """Normalised registry key for a company / fiscal year pair."""
+    return normalise_company(company), str(fiscal_year).strip()
+
+
+def load_shard_registry() -> Dict[Tuple[str, str], dict]:
+    """Load the shard registry (cached). Falls back to the single default shard."""
+    global _registry_cache
+    if _registry_cache is not None:
+        return _registry_cache
+
+    if SHARDS_CONFIG:
+        with open(SHARDS_CONFIG, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+    else:
+        entries = [{
+            "company": DEFAULT_COMPANY,
+            "fiscal_year": DEFAULT_FISCAL_YEAR,
+            "pdf_path": PDF_PATH,
+            "index_path": INDEX_PATH,
+            "meta_path": META_PATH,
+            "figures_path": FIGURES_PATH,
+        }]
+
+    registry = {}
+    for entry in entries:
+        key = shard_key(entry["company"], entry["fiscal_year"])
+        if key in registry:
+            raise ValueError(f"Duplicate RAG shard: {entry['company']} {entry['fiscal_year']}")
+        registry[key] = entry
+
+    _registry_cache = registry
+    return registry
+
+
+def resolve_shards(
+    allowed_companies: Iterable[str],
+    company: Optional[str] = None,
+    fiscal_year: Optional[str] = None,
+) -> List[Tuple[str, str]]:
+    """Return the shard keys a request may search.
+
+    `allowed_companies` are the user's entitlements (["ALL"] means every company).
+    `company` / `fiscal_year` narrow the search further; shards outside the
+    user's entitlements are never returned.
+    """
+    keys = []
+    for key in load_shard_registry():
+        shard_company, shard_year = key
+        if not is_entitled(allowed_companies, shard_company):
+            continue
+        if company and shard_company != normalise_company(company):
+            continue
+        if fiscal_year and shard_year != str(fiscal_year).strip():
+            continue
+        keys.append(key)
+    return keys
+
+
+def build_index_from_pdf(
+    pdf_path: str,
+    index_path: str = INDEX_PATH,
+    meta_path: str = META_PATH,
+    figures_path: Optional[str] = FIGURES_PATH,
+) -> dict:
+    """Builds a FAISS index from the PDF and saves it, along with extracted statement figures."""
+    if os.path.dirname(index_path) and not os.path.exists(os.path.dirname(index_path)):
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
 
     print(f"[INFO] Reading PDF: {pdf_path}")
     text = read_pdf_text(pdf_path)
@@ -87,43 +185,126 @@ def build_index_from_pdf(pdf_path: str) -> dict:
     index = faiss.IndexFlatL2(embeddings.shape[1])
     index.add(embeddings)
 
-    faiss.write_index(index, INDEX_PATH)
-    with open(META_PATH, "w", encoding="utf-8") as f:
+    faiss.write_index(index, index_path)
+    with open(meta_path, "w", encoding="utf-8") as f:
         json.dump(chunks, f, ensure_ascii=False, indent=2)
 
-    return {"status": "built", "chunks": len(chunks)}
+    figures = 0
+    if figures_path:
+        try:
+            records = extract_figures_from_pdf(pdf_path)
+            save_figures(records, figures_path)
+            figures = len(records)
+        except Exception as e:
+            print(f"[WARN] Figure extraction failed for {pdf_path}: {e}")
+
+    return {"status": "built", "chunks": len(chunks), "figures": figures}
 
 
-def load_index() -> Tuple[faiss.IndexFlatL2, List[str]]:
-    """Load FAISS index and metadata from disk."""
-    if not os.path.exists(INDEX_PATH) or not os.path.exists(META_PATH):
-        print("[WARN] No index found, building new one...")
-        build_index_from_pdf(PDF_PATH)
+def load_index(shard: dict, build: bool = True) -> Tuple[faiss.IndexFlatL2, List[str]]:
+    """Load a shard's FAISS index and metadata from disk.
+
+    With `build`, a missing index (or figures file) is built from the shard's PDF
+    first; without it, a missing index raises FileNotFoundError.
+    """
+    index_path, meta_path = shard["index_path"], shard["meta_path"]
+    if not os.path.exists(index_path) or not os.path.exists(meta_path):
+        if not build:
+            raise FileNotFoundError(f"No prebuilt index for {shard['company']} {shard['fiscal_year']}")
+        print(f"[WARN] No index found for {shard['company']} {shard['fiscal_year']}, building new one...")
+        build_index_from_pdf(shard["pdf_path"], index_path, meta_path, shard.get("figures_path"))
+    elif build and shard.get("figures_path") and not os.path.exists(shard["figures_path"]):
+        print(f"[WARN] No figures found for {shard['company']} {shard['fiscal_year']}, extracting...")
+        try:
+            save_figures(extract_figures_from_pdf(shard["pdf_path"]), shard["figures_path"])
+        except Exception as e:
+            # A prebuilt index is still usable for retrieval without structured figures.
+            print(f"[WARN] Figure extraction failed for {shard['company']} {shard['fiscal_year']}: {e}")
 
-    index = faiss.read_index(INDEX_PATH)
-    with open(META_PATH, "r", encoding="utf-8") as f:
+    index = faiss.read_index(index_path)
+    with open(meta_path, "r", encoding="utf-8") as f:
         meta = json.load(f)
 
     return index, meta
 
 
-def ensure_index() -> Tuple[faiss.IndexFlatL2, List[str]]:
-    """Ensure index is loaded in memory (cached)."""
-    global _index_cache, _meta_cache
-    if _index_cache is None or _meta_cache is None:
-        _index_cache, _meta_cache = load_index()
-    return _index_cache, _meta_cache
+def _lock_for(key: Tuple[str, str]) -> threading.Lock:
+    with _shard_locks_guard:
+        return _shard_locks.setdefault(key, threading.Lock())
+
+
+def ensure_index(key: Optional[Tuple[str, str]] = None, build: bool = False) -> Tuple[faiss.IndexFlatL2, List[str]]:
+    """Ensure a shard's index is loaded in memory (cached). Defaults to the default shard.
+
+    Request paths call this without `build`: only prebuilt indexes are loaded, and
+    a shard that failed to load fails fast until it is rebuilt with `build=True`.
+    """
+    if key is None:
+        key = shard_key(DEFAULT_COMPANY, DEFAULT_FISCAL_YEAR)
+    cached = _shard_cache.get(key)
+    if cached is not None:
+        return cached
+    if not build and key in _shard_failures:
+        raise RuntimeError(f"RAG shard {key} unavailable: {_shard_failures[key]}")
+
+    registry = load_shard_registry()
+    if key not in registry:
+        raise KeyError(f"Unknown RAG shard: {key}")
+    # One lock per shard: loading one shard never blocks first loads of another.
+    with _lock_for(key):
+        if key not in _shard_cache:
+            try:
+                _shard_cache[key] = load_index(registry[key], build=build)
+            except Exception as e:
+                _shard_failures[key] = str(e)
+                raise
+            _shard_failures.pop(key, None)
+    return _shard_cache[key]
+
+
+def ensure_all_indexes() -> Dict[Tuple[str, str], Tuple[faiss.IndexFlatL2, List[str]]]:
+    """Load (building if needed) every registered shard at startup; failures are remembered and skipped."""
+    loaded = {}
+    for key in load_shard_registry():
+        try:
+            loaded[key] = ensure_index(key, build=True)
+        except Exception as e:
+            print(f"[WARN] RAG shard {key} unavailable: {e}")
+    return loaded
 
 
 # ---------- RAG QUERY ----------
-def query_rag(query: str, top_k: int = 5) -> List[str]:
-    """Retrieve most relevant chunks for a given query."""
-    index, meta = ensure_index()
-    model = get_model()
+def _search_shard(key: Tuple[str, str], q_emb: np.ndarray, top_k: int) -> List[Tuple[float, str]]:
+    try:
+        index, meta = ensure_index(key)
+    except Exception as e:
+        print(f"[WARN] Skipping RAG shard {key}: {e}")
+        return []
+    D, I = index.search(q_emb, top_k)
+    return [(float(d), meta[i]) for d, i in zip(D[0], I[0]) if 0 <= i < len(meta)]
+
 
+def query_rag(query: str, top_k: int = 5, shards: Optional[List[Tuple[str, str]]] = None) -> List[str]:
+    """Retrieve most relevant chunks for a given query.
+
+    Only the given shards are searched (default shard if None). Multiple shards
+    are searched in parallel and their hits merged by distance.
+    """
+    if shards is None:
+        shards = [shard_key(DEFAULT_COMPANY, DEFAULT_FISCAL_YEAR)]
+    if not shards:
+        return []
+
+    model = get_model()
     q_emb = model.encode([query], convert_to_numpy=True)
-    D, I = index.search(q_emb, top_k)
 
-    retrieved_chunks = [meta[i] for i in I[0] if i < len(meta)]
-    print(f"[INFO] Retrieved {len(retrieved_chunks)} chunks for query.")
+    if len(shards) == 1:
+        hits = _search_shard(shards[0], q_emb, top_k)
+    else:
+        results = _shard_pool.map(lambda key: _search_shard(key, q_emb, top_k), shards)
+        hits = [hit for shard_hits in results for hit in shard_hits]
+
+    hits.sort(key=lambda hit: hit[0])
+    retrieved_chunks = [chunk for _, chunk in hits[:top_k]]
+    print(f"[INFO] Retrieved {len(retrieved_chunks)} chunks from {len(shards)} shard(s).")
     return retrieved_chunks
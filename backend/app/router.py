@@ -0,0 +1,192 @@
+"""
+router.py — Answers pure figure lookups and ratio questions without the LLM.
+
+`route_question()` matches metric names and ratio formulas in a question against
+the structured figures. It only answers when the question is nothing but metric
+/ratio names, years and filler words ("what is the total equity in FY2023?") and
+every value is available; otherwise it returns None and the caller falls through
+to RAG + LLM.
+"""
+
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# key -> (label, synonyms)
+METRICS = {
+    "total_assets": ("Total assets", ["total assets", "assets"]),
+    "total_liabilities": ("Total liabilities", ["total liabilities", "liabilities"]),
+    "total_equity": ("Total equity", ["total equity", "shareholders equity", "shareholder equity", "net worth", "equity"]),
+    "revenue_from_operations": ("Revenue from operations", ["revenue from operations", "revenue", "sales", "turnover", "top line"]),
+    "profit_for_the_year": ("Profit for the year", ["profit for the year", "net profit", "net income", "profit", "pat", "bottom line"]),
+    "cash_and_cash_equivalents": ("Cash and cash equivalents", ["cash and cash equivalents", "cash balance", "cash"]),
+    "inventories": ("Inventories", ["inventories", "inventory"]),
+    "trade_receivables": ("Trade receivables", ["trade receivables", "receivables", "debtors"]),
+}
+
+# name -> (label, synonyms, numerator, denominator, as_percent)
+RATIOS = {
+    "debt_to_equity": ("Debt to equity ratio", ["debt to equity", "debt equity", "d/e", "leverage ratio", "gearing"], "total_liabilities", "total_equity", False),
+    "equity_ratio": ("Equity ratio", ["equity ratio", "equity to assets"], "total_equity", "total_assets", False),
+    "debt_ratio": ("Debt ratio", ["debt ratio", "debt to assets", "liabilities to assets"], "total_liabilities", "total_assets", False),
+    "net_profit_margin": ("Net profit margin", ["net profit margin", "profit margin", "net margin"], "profit_for_the_year", "revenue_from_operations", True),
+    "return_on_equity": ("Return on equity", ["return on equity", "roe"], "profit_for_the_year", "total_equity", True),
+    "return_on_assets": ("Return on assets", ["return on assets", "roa"], "profit_for_the_year", "total_assets", True),
+    "asset_turnover": ("Asset turnover", ["asset turnover"], "revenue_from_operations", "total_assets", False),
+}
+
+# Questions asking for judgement rather than a number go to the LLM.
+OPEN_ENDED_RE = re.compile(
+    r"\b(why|explain|should|recommend|suggest|compare|comparison|trend|outlook|risk|analy[sz]e|analysis|"
+    r"interpret|insight|improve|impact|forecast|predict|healthy|good|bad|summar)\w*",
+    re.I,
+)
+# Qualified line items ("current assets", "operating profit") are not headline figures.
+QUALIFIER_RE = re.compile(
+    r"\b(current|non-current|operating|gross|fixed|deferred|other|segment|flows?|per share|ebitda|standalone|"
+    r"before tax|tax\w*|growth|grew|attributable|minority|non-controlling|dividends?)\b",
+    re.I,
+)
+# "2024", "FY2024", "FY 2023-24", "2023/2024"; a range means the fiscal year ending in its second year.
+YEAR_RE = re.compile(r"\b(?:fy\s*)?(20\d{2})(?:\s*[-–/]\s*(\d{2}(?:\d{2})?))?\b", re.I)
+# Words allowed around the matched metrics; anything else means we did not understand the question.
+FILLER_WORDS = {
+    "what", "whats", "is", "was", "are", "were", "the", "a", "an", "of", "for", "in", "and", "its", "their",
+    "tell", "me", "show", "give", "get", "please", "how", "much", "value", "figure", "figures", "amount",
+    "number", "ratio", "reported", "fy", "year", "financial", "fiscal", "as", "at", "on", "ended", "ending",
+    "company", "companys", "consolidated", "reliance", "reliances", "industries", "limited", "ril",
+}
+
+
+def _build_patterns() -> List[Tuple[re.Pattern, str, str]]:
+    """(pattern, kind, name) for every synonym, longest first so 'debt to equity' beats 'equity'."""
+    entries = [(syn, "ratio", name) for name, (_, syns, *_rest) in RATIOS.items() for syn in syns]
+    entries += [(syn, "metric", key) for key, (_, syns) in METRICS.items() for syn in syns]
+    entries.sort(key=lambda e: len(e[0]), reverse=True)
+    return [(re.compile(rf"(?<![\w/]){re.escape(syn)}(?![\w/])", re.I), kind, name) for syn, kind, name in entries]
+
+
+PATTERNS = _build_patterns()
+
+
+def match_entities(question: str) -> Tuple[List[Tuple[str, str]], str]:
+    """Return ([(kind, name)] in order of appearance, question with the matches blanked out)."""
+    text = question.replace("'", "").replace("’", "")
+    found = []
+    for pattern, kind, name in PATTERNS:
+        for m in pattern.finditer(text):
+            found.append((m.start(), kind, name))
+            # Blank out the match so shorter synonyms inside it don't match again.
+            text = text[:m.start()] + " " * (m.end() - m.start()) + text[m.end():]
+    found.sort()
+    matches = []
+    for _, kind, name in found:
+        if (kind, name) not in matches:
+            matches.append((kind, name))
+    return matches, text
+
+
+def parse_years(text: str) -> Optional[List[str]]:
+    """Fiscal years (end year) mentioned in `text`; None if a range is not a single fiscal year."""
+    years = []
+    for start, end in YEAR_RE.findall(text):
+        if end:
+            end = end if len(end) == 4 else start[:2] + end
+            if int(end) != int(start) + 1:
+                return None
+            years.append(end)
+        else:
+            years.append(start)
+    return years
+
+
+def _format_value(value: float) -> str:
+    return f"₹{value:,.0f} crore"
+
+
+def route_question(
+    question: str,
+    figures: Dict[str, float],
+    figure_index: Dict[Tuple[str, str], dict],
+    company: str,
+    data_year: str,
+    fiscal_year: Optional[str] = None,
+) -> Optional[dict]:
+    """Answer a lookup/ratio question from structured figures, or return None to fall through.
+
+    `figures` are the headline figures for `data_year`. The year answered is the
+    one named in the question, else the requested `fiscal_year`, else `data_year`;
+    any other year is looked up in `figure_index` ((key, year) -> record).
+    """
+    if OPEN_ENDED_RE.search(question) or QUALIFIER_RE.search(question):
+        return None
+    matches, rest = match_entities(question)
+    if not matches:
+        return None
+
+    years = parse_years(rest)
+    if years is None or len(set(years)) > 1:
+        return None
+    rest = YEAR_RE.sub(" ", rest)
+    allowed = FILLER_WORDS | set(re.findall(r"[a-z0-9]+", company.lower()))
+    if any(word not in allowed for word in re.findall(r"[a-z0-9]+", rest.lower())):
+        return None
+    year = years[0] if years else (fiscal_year or data_year)
+
+    def lookup(key: str) -> Optional[float]:
+        if year == data_year and key in figures:
+            return figures[key]
+        record = figure_index.get((key, year))
+        return record["value"] if record else None
+
+    lines, values = [], {}
+    for kind, name in matches:
+        if kind == "metric":
+            value = lookup(name)
+            if value is None:
+                return None
+            label = METRICS[name][0]
+            values[name] = value
+            lines.append(f"{label} for {company} in FY{year} is {_format_value(value)}.")
+        else:
+            label, _, num_key, den_key, as_percent = RATIOS[name]
+            num, den = lookup(num_key), lookup(den_key)
+            if num is None or not den:
+                return None
+            ratio = num / den
+            values[name] = round(ratio, 4)
+            shown = f"{ratio * 100:.2f}%" if as_percent else f"{ratio:.2f}"
+            lines.append(
+                f"{label} for {company} in FY{year} is {shown} "
+                f"({METRICS[num_key][0]} {_format_value(num)} / {METRICS[den_key][0]} {_format_value(den)})."
+            )
+
+    return {"answer": " ".join(lines), "values": values, "year": year}
+
+
+class RouterStats:
+    """Thread-safe counters of how many questions were answered locally."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = 0
+        self.local = 0
+
+    def record(self, served_locally: bool) -> None:
+        with self._lock:
+            self.total += 1
+            if served_locally:
+                self.local += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total, local = self.total, self.local
+        return {
+            "total": total,
+            "local": local,
+            "fallthrough": total - local,
+            "local_share": round(local / total, 4) if total else 0.0,
+        }
+
+
+ROUTER_STATS = RouterStats()
@@ -0,0 +1,173 @@
+"""
+loadtest.py — Load generator for the Balance Sheet Analyst API.
+
+Drives /login, /balance-sheet and /analyze with a weighted mix at a fixed
+concurrency and reports latency percentiles and error rates per endpoint.
+/analyze is sent with provider="stub" by default so no external LLM is needed.
+
+Examples (from backend/):
+    python loadtest.py --base-url http://127.0.0.1:8000 --concurrency 20 --requests 500
+    python loadtest.py --in-process --mix login=1,balance=4,analyze=2 --profile
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from typing import Dict, List
+
+import httpx
+
+QUESTIONS = [
+    # answered by the local router
+    "What is total equity?",
+    "What's the debt to equity ratio?",
+    "What is the return on equity?",
+    # fall through to RAG + LLM
+    "Explain the main risks highlighted in the annual report.",
+    "Why did inventories change during the year?",
+]
+
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("login", "balance", "analyze"):
+            raise argparse.ArgumentTypeError(f"Unknown endpoint in mix: {name}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[k]
+
+
+async def run(args) -> dict:
+    if args.in_process:
+        os.environ.setdefault("LLM_PROVIDER", "stub")
+        from app.main import app
+        transport = httpx.ASGITransport(app=app)
+    else:
+        transport = None
+
+    headers = {"X-Profile": "1"} if args.profile else {}
+    mix = parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+    rng = random.Random(args.seed)
+    plan = rng.choices(names, weights=weights, k=args.requests)
+
+    latencies: Dict[str, List[float]] = {name: [] for name in names}
+    errors: Dict[str, int] = {name: 0 for name in names}
+    queue: asyncio.Queue = asyncio.Queue()
+    for i, name in enumerate(plan):
+        queue.put_nowait((i, name))
+
+    async with httpx.AsyncClient(
+        base_url=args.base_url, transport=transport, headers=headers, timeout=args.timeout
+    ) as client:
+        login = {"email": args.email, "password": args.password}
+        r = await client.post("/login", json=login)
+        r.raise_for_status()
+        token = r.json()["token"]
+
+        async def call(i: int, name: str) -> httpx.Response:
+            if name == "login":
+                return await client.post("/login", json=login)
+            if name == "balance":
+                return await client.get("/balance-sheet", params={"token": token})
+            body = {"question": QUESTIONS[i % len(QUESTIONS)]}
+            if args.provider:
+                body["provider"] = args.provider
+            return await client.post("/analyze", json=body, params={"token": token})
+
+        async def worker():
+            while True:
+                try:
+                    i, name = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                start = time.perf_counter()
+                try:
+                    r = await call(i, name)
+                    ok = r.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                latencies[name].append((time.perf_counter() - start) * 1000)
+                if not ok:
+                    errors[name] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        wall = time.perf_counter() - start
+
+        router_stats = None
+        try:
+            router_stats = (await client.get("/router/stats")).json()
+        except (httpx.HTTPError, ValueError):
+            pass
+
+    report = {"requests": len(plan), "concurrency": args.concurrency, "seconds": round(wall, 3),
+              "throughput_rps": round(len(plan) / wall, 1) if wall else 0.0, "endpoints": {}}
+    for name in names:
+        values = latencies[name]
+        report["endpoints"][name] = {
+            "count": len(values),
+            "errors": errors[name],
+            "error_rate": round(errors[name] / len(values), 4) if values else 0.0,
+            "p50_ms": round(percentile(values, 50), 1),
+            "p90_ms": round(percentile(values, 90), 1),
+            "p99_ms": round(percentile(values, 99), 1),
+            "max_ms": round(max(values), 1) if values else 0.0,
+        }
+    if router_stats is not None:
+        report["router"] = router_stats
+    return report
+
+
+def print_report(report: dict) -> None:
+    print(f"{report['requests']} requests, concurrency {report['concurrency']}, "
+          f"{report['seconds']}s, {report['throughput_rps']} req/s")
+    print(f"{'endpoint':<10}{'count':>7}{'errors':>8}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for name, s in report["endpoints"].items():
+        print(f"{name:<10}{s['count']:>7}{s['errors']:>8}{s['p50_ms']:>9}{s['p90_ms']:>9}{s['p99_ms']:>9}{s['max_ms']:>9}")
+    if "router" in report:
+        print(f"router served {report['router']['local_share']:.1%} of /analyze locally")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Balance Sheet Analyst API.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--in-process", action="store_true", help="drive app.main:app directly, no server needed")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--mix", default="login=1,balance=3,analyze=2", help="weighted endpoint mix")
+    parser.add_argument("--provider", default="stub", help="LLM provider for /analyze ('' for server default)")
+    parser.add_argument("--email", default="analyst@company.com")
+    parser.add_argument("--password", default="analyst123")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profile", action="store_true", help="send X-Profile: 1 (needs PROFILE_REQUESTS=header)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(report)
+    failed = sum(s["errors"] for s in report["endpoints"].values())
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+from pathlib import Path
+
+import pytest
+
+from app.extract import LINE_RE, assemble_records, build_figure_index, parse_number, parse_page
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def page(number):
+    return parse_page((FIXTURES / f"reliance_p{number}.txt").read_text(encoding="utf-8"), number)
+
+
+@pytest.fixture(scope="module")
+def index():
+    pages = [page(n) for n in (215, 216, 217, 218, 221, 222, 279)]
+    return build_figure_index(assemble_records([p for p in pages if p]))
+
+
+@pytest.mark.parametrize("key, year, value, statement", [
+    ("total_assets", "2024", 1755986.0, "balance_sheet"),
+    ("inventories", "2023", 140008.0, "balance_sheet"),
+    # Page 216 carries no title; it continues the balance sheet from page 215.
+    ("total_equity", "2024", 925788.0, "balance_sheet"),
+    ("total_liabilities", "2023", 778550.0, "balance_sheet"),
+    # P&L columns are headed "2023-24 2022-23", not dated.
+    ("revenue_from_operations", "2024", 914472.0, "profit_and_loss"),
+    ("revenue_from_operations", "2023", 891311.0, "profit_and_loss"),
+    ("profit_for_the_year", "2024", 79020.0, "profit_and_loss"),
+    ("profit_for_the_year", "2023", 74088.0, "profit_and_loss"),
+    ("dividend_paid", "2024", -6089.0, "cash_flow"),
+])
+def test_statement_figures(index, key, year, value, statement):
+    record = index[(key, year)]
+    assert record["value"] == value
+    assert record["statement"] == statement
+
+
+def test_statement_titles_and_column_years():
+    assert page(217)["statement"] == "profit_and_loss"
+    assert page(217)["years"] == ["2024", "2023"]
+    assert page(221)["statement"] == "cash_flow"
+    assert page(216)["statement"] is None
+
+
+def test_ignores_notes_mentioning_balance_sheet():
+    # Hedge accounting note: "Line Item in Balance Sheet" and maturity dates up to 2034.
+    assert page(279) is None
+
+
+def test_only_statement_years(index):
+    assert {year for _, year in index} == {"2024", "2023"}
+
+
+def test_rows_with_unmatched_columns_are_dropped():
+    text = (FIXTURES / "reliance_p222.txt").read_text(encoding="utf-8")
+    parsed = parse_page(text, 222)
+    labels = [label for label, _ in parsed["rows"]]
+    # Four-column "Change in Liability" table under the cash flow statement.
+    assert "Total" not in labels
+    assert ("Closing Balance of Cash and Cash Equivalents (Refer Note 10)", [97225.0, 68664.0]) in parsed["rows"]
+
+
+def test_parse_number():
+    assert parse_number("1,52,770") == 152770.0
+    assert parse_number("(4,883)") == -4883.0
+    assert parse_number("–") == 0.0
+
+
+@pytest.mark.parametrize("line", [
+    "Total assets " + "1" * 40 + " x",
+    "Total Assets 17,55,986.00 16,07,431.00 15,00,000.00 *",
+])
+def test_line_regex_does_not_backtrack(line):
+    assert LINE_RE.match(line) is None
@@ -0,0 +1,71 @@
+import pytest
+
+from app.router import RouterStats, route_question
+
+FIGURES = {
+    "total_assets": 1755986.0,
+    "total_liabilities": 830198.0,
+    "total_equity": 925788.0,
+    "revenue_from_operations": 914472.0,
+    "profit_for_the_year": 79020.0,
+    "cash_and_cash_equivalents": 97225.0,
+}
+INDEX = {("total_assets", "2023"): {"value": 1607431.0}}
+COMPANY = "Reliance Industries Limited (Consolidated)"
+
+
+def route(question, fiscal_year=None):
+    return route_question(question, FIGURES, INDEX, COMPANY, "2024", fiscal_year)
+
+
+@pytest.mark.parametrize("question, key, value", [
+    ("What is total equity?", "total_equity", 925788.0),
+    ("What's the debt to equity ratio?", "debt_to_equity", 0.8967),
+    ("What was Reliance's net worth in FY2024?", "total_equity", 925788.0),
+    ("total assets in FY 2022-23", "total_assets", 1607431.0),
+    ("What is the return on equity?", "return_on_equity", 0.0854),
+])
+def test_answers_lookups_and_ratios(question, key, value):
+    routed = route(question)
+    assert routed is not None
+    assert routed["values"][key] == value
+
+
+def test_uses_index_for_other_years():
+    routed = route("What were total assets in 2023?")
+    assert routed["year"] == "2023"
+    assert "FY2023" in routed["answer"]
+
+
+@pytest.mark.parametrize("question", [
+    "What is total equity?",
+    "What is total equity in FY2023?",
+])
+def test_never_labels_data_year_figures_as_another_year(question):
+    # FY2023 equity is not in the index, so this must fall through rather than reuse FY2024.
+    assert route(question, fiscal_year="2023") is None
+
+
+@pytest.mark.parametrize("question", [
+    "What is the profit before tax?",
+    "What is the tax on profit?",
+    "profit attributable to non-controlling interests?",
+    "dividend paid out of profit?",
+    "What is the revenue growth?",
+    "What is Jio's revenue?",
+    "What is price to sales?",
+    "Is total debt more than cash?",
+    "What is revenue in FY 2024-25?",
+    "Why did profit fall?",
+    "What is operating profit?",
+    "Tell me about the company",
+])
+def test_falls_through_when_not_confident(question):
+    assert route(question) is None
+
+
+def test_stats_share():
+    stats = RouterStats()
+    stats.record(True)
+    stats.record(False)
+    assert stats.snapshot() == {"total": 2, "local": 1, "fallthrough": 1, "local_share": 0.5}